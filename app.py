@@ -1,22 +1,212 @@
 # app.py (complete working version with next [day] fix)
 import os
-import json
+import orjson
+import fastjsonschema
+import copy
+import asyncio
+import time
 import logging
-import requests
+import httpx
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Dict, Any
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import re
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
-
 # Ollama settings
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:3b-instruct-q4_K_M")
+
+# Batching settings
+MAX_BATCH = 8
+BATCH_WINDOW_MS = 10
+
+# Extraction cache settings
+EXTRACT_CACHE_SIZE = 1024
+
+# How long a /health probe result is reused
+HEALTH_CACHE_SECONDS = 5
+
+# Shared HTTP client (keep-alive pool reused across requests), set up in lifespan
+http_client: httpx.AsyncClient = None
+
+class BatchScheduler:
+    """Collect generate requests arriving within a short window and send them to Ollama together.
+
+    Ollama's /api/generate takes a single prompt, so a batch is dispatched as
+    concurrent in-flight requests which Ollama schedules side by side.
+    """
+
+    def __init__(self, max_batch: int = MAX_BATCH, window_ms: int = BATCH_WINDOW_MS):
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self._queue: asyncio.Queue = None
+        self._worker: asyncio.Task = None
+        self._inflight = set()
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        # Fail anything still waiting so callers drop to the fallback
+        while self._queue is not None and not self._queue.empty():
+            self._fail(self._queue.get_nowait())
+
+    async def submit(self, payload: Dict[str, Any], timeout: float = None) -> Dict[str, Any]:
+        """Queue one /api/generate payload and wait for its decoded JSON output"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((payload, timeout, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                await asyncio.sleep(self.window)
+            except asyncio.CancelledError:
+                for item in batch:
+                    self._fail(item)
+                raise
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            # Don't wait on the batch here so the next window can start collecting
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    @staticmethod
+    def _fail(item):
+        future = item[-1]
+        if not future.done():
+            future.set_exception(RuntimeError("Batch scheduler stopped"))
+
+    async def _dispatch(self, batch):
+        results = await asyncio.gather(
+            *(self._generate(payload, timeout) for payload, timeout, _ in batch),
+            return_exceptions=True
+        )
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    @classmethod
+    async def _generate(cls, payload: Dict[str, Any], timeout: float = None) -> Dict[str, Any]:
+        """Stream a generate call, capping the whole extraction at timeout seconds.
+
+        httpx's timeout only bounds the gap between streamed chunks, so the
+        overall deadline is enforced here.
+        """
+        return await asyncio.wait_for(cls._stream_json(payload, timeout), timeout)
+
+    @staticmethod
+    async def _stream_json(payload: Dict[str, Any], timeout: float = None) -> Dict[str, Any]:
+        """Stream a generate call and stop as soon as the top-level JSON object closes.
+
+        Leaving the stream early closes the connection, which makes Ollama abort
+        the rest of the generation.
+        """
+        buffer = ""
+        depth = 0
+        async with http_client.stream("POST", "/api/generate", json=payload, timeout=timeout) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                fragment = orjson.loads(line)
+                chunk = fragment.get("response", "")
+                buffer += chunk
+                depth += chunk.count("{") - chunk.count("}")
+                
+                if fragment.get("done"):
+                    break
+                if depth <= 0 and "{" in buffer:
+                    # Braces inside string values can balance early; keep reading if so
+                    try:
+                        return orjson.loads(buffer)
+                    except orjson.JSONDecodeError:
+                        continue
+        return orjson.loads(buffer)
+
+scheduler = BatchScheduler()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    http_client = httpx.AsyncClient(
+        base_url=OLLAMA_HOST,
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=30)
+    )
+    await scheduler.start()
+    try:
+        yield
+    finally:
+        await scheduler.stop()
+        await http_client.aclose()
+        http_client = None
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Precompiled patterns used on every request
+_TIME_RE = re.compile(r"T(\d{2}:\d{2}:\d{2})")
+_NEXT_DAY_RE = re.compile(r"next\s+(monday|tuesday|wednesday|thursday|friday|saturday|sunday)")
+_CLOCK_RE = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?")
+_DURATION_RE = re.compile(r"for\s+(\d+)\s+(hour|minute)")
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+
+# Lookup tables and prompt shared by every request
+_DAY_MAPPING = {
+    'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
+    'friday': 4, 'saturday': 5, 'sunday': 6
+}
+
+_MONTH_PATTERNS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
+    'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12
+}
+
+# One pass over the utterance for any "<month> <day>" instead of a scan per month
+_MONTH_DAY_RE = re.compile(rf"({'|'.join(_MONTH_PATTERNS)})\s+(\d{{1,2}})(?:st|nd|rd|th)?")
+
+# Shape of a usable Ollama extraction, compiled once at import
+_EVENT_SCHEMA = {
+    "type": "object",
+    "required": ["intent"],
+    "properties": {
+        "intent": {"type": "string"},
+        "title": {"type": ["string", "null"]},
+        "start": {"type": ["string", "null"]},
+        "end": {"type": ["string", "null"]},
+        "duration_minutes": {"type": ["integer", "null"]},
+        "attendees": {"type": ["array", "null"]},
+        "timezone": {"type": ["string", "null"]}
+    }
+}
+_validate_event = fastjsonschema.compile(_EVENT_SCHEMA)
+
+_SYSTEM_PROMPT = """You are a calendar assistant. Today is {current_date}. 
+        Return JSON with: intent, title, start, end, duration_minutes, attendees.
+        Use CURRENT REAL DATES, not old dates!"""
 
 class EventRequest(BaseModel):
     utterance: str
@@ -38,27 +228,22 @@ def validate_and_correct_dates(event_data: Dict[str, Any], utterance: str = "")
     try:
         start_str = event_data.get("start", "")
         utterance_lower = utterance.lower()
-        current_year = datetime.now().year
+        today = datetime.now()
+        current_year = today.year
         
         # Check if date is wrong (not current year)
         if start_str and str(current_year) not in start_str:
-            time_match = re.search(r"T(\d{2}:\d{2}:\d{2})", start_str)
+            time_match = _TIME_RE.search(start_str)
             if time_match:
                 time_part = time_match.group(1)
                 
-                today = datetime.now()
                 corrected_date = today
                 
                 # Handle "next [day]" patterns
-                day_mapping = {
-                    'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
-                    'friday': 4, 'saturday': 5, 'sunday': 6
-                }
-                
-                next_day_match = re.search(r"next\s+(monday|tuesday|wednesday|thursday|friday|saturday|sunday)", utterance_lower)
+                next_day_match = _NEXT_DAY_RE.search(utterance_lower)
                 if next_day_match:
                     day_name = next_day_match.group(1)
-                    target_weekday = day_mapping[day_name]
+                    target_weekday = _DAY_MAPPING[day_name]
                     current_weekday = today.weekday()
                     
                     days_until_next = (target_weekday - current_weekday) % 7
@@ -66,49 +251,39 @@ def validate_and_correct_dates(event_data: Dict[str, Any], utterance: str = "")
                         days_until_next += 7
                     
                     corrected_date = today + timedelta(days=days_until_next)
-                    logger.info(f"Corrected 'next {day_name}': {corrected_date.strftime('%Y-%m-%d')}")
+                    logger.info("Corrected 'next %s': %s", day_name, corrected_date.date())
                 
                 # Handle "tomorrow"
                 elif "tomorrow" in utterance_lower:
                     corrected_date = today + timedelta(days=1)
-                    logger.info(f"Corrected 'tomorrow': {corrected_date.strftime('%Y-%m-%d')}")
+                    logger.info("Corrected 'tomorrow': %s", corrected_date.date())
                 
                 # Handle specific dates (September 6th)
                 else:
-                    month_patterns = {
-                        'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
-                        'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12
-                    }
-                    
-                    date_found = False
-                    for month_name, month_num in month_patterns.items():
-                        if month_name in utterance_lower:
-                            day_match = re.search(rf"{month_name}\s+(\d{{1,2}})(?:st|nd|rd|th)?", utterance_lower)
-                            if day_match:
-                                day_num = int(day_match.group(1))
-                                corrected_date = datetime(current_year, month_num, day_num)
-                                logger.info(f"Corrected specific date: {corrected_date.strftime('%Y-%m-%d')}")
-                                date_found = True
-                                break
-                    
-                    if not date_found:
+                    month_day_match = _MONTH_DAY_RE.search(utterance_lower)
+                    if month_day_match:
+                        month_num = _MONTH_PATTERNS[month_day_match.group(1)]
+                        day_num = int(month_day_match.group(2))
+                        corrected_date = datetime(current_year, month_num, day_num)
+                        logger.info("Corrected specific date: %s", corrected_date.date())
+                    else:
                         corrected_date = today + timedelta(days=1)
-                        logger.info(f"Default correction to tomorrow: {corrected_date.strftime('%Y-%m-%d')}")
+                        logger.info("Default correction to tomorrow: %s", corrected_date.date())
                 
                 # Apply corrected date
-                corrected_start = f"{corrected_date.strftime('%Y-%m-%d')}T{time_part}-05:00"
-                event_data["start"] = corrected_start
+                corrected_prefix = corrected_date.strftime('%Y-%m-%d')
+                event_data["start"] = f"{corrected_prefix}T{time_part}-05:00"
                 
                 # Correct end time too
                 if "end" in event_data:
                     end_str = event_data["end"]
-                    end_time_match = re.search(r"T(\d{2}:\d{2}:\d{2})", end_str)
+                    end_time_match = _TIME_RE.search(end_str)
                     if end_time_match:
                         end_time_part = end_time_match.group(1)
-                        event_data["end"] = f"{corrected_date.strftime('%Y-%m-%d')}T{end_time_part}-05:00"
+                        event_data["end"] = f"{corrected_prefix}T{end_time_part}-05:00"
     
     except Exception as e:
-        logger.error(f"Date correction failed: {e}")
+        logger.error("Date correction failed: %s", e)
     
     return event_data
 
@@ -120,17 +295,12 @@ def extract_event_fallback(utterance: str) -> Dict[str, Any]:
     today = datetime.now()
     
     # Handle "next [day]" patterns
-    day_mapping = {
-        'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
-        'friday': 4, 'saturday': 5, 'sunday': 6
-    }
-    
     event_date = None
-    next_day_match = re.search(r"next\s+(monday|tuesday|wednesday|thursday|friday|saturday|sunday)", utterance_lower)
+    next_day_match = _NEXT_DAY_RE.search(utterance_lower)
     
     if next_day_match:
         day_name = next_day_match.group(1)
-        target_weekday = day_mapping[day_name]
+        target_weekday = _DAY_MAPPING[day_name]
         current_weekday = today.weekday()
         
         days_until_next = (target_weekday - current_weekday) % 7
@@ -140,15 +310,21 @@ def extract_event_fallback(utterance: str) -> Dict[str, Any]:
         event_date = today + timedelta(days=days_until_next)
         result["title"] = f"{day_name.title()} Meeting"
         
-    elif "tomorrow" in utterance_lower:
-        event_date = today + timedelta(days=1)
-        
     else:
+        # "tomorrow" and unspecified dates both land on the next day
         event_date = today + timedelta(days=1)
     
+    # Parse duration (defaults to one hour)
+    duration_match = _DURATION_RE.search(utterance_lower)
+    end_delta = timedelta(hours=1)
+    if duration_match:
+        duration = int(duration_match.group(1))
+        duration_minutes = duration * 60 if duration_match.group(2) == "hour" else duration
+        end_delta = timedelta(minutes=duration_minutes)
+    
     # Parse time
-    time_match = re.search(r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", utterance_lower)
-    if time_match and event_date:
+    time_match = _CLOCK_RE.search(utterance_lower)
+    if time_match:
         hour = int(time_match.group(1))
         minute = int(time_match.group(2) or "0")
         period = time_match.group(3)
@@ -158,87 +334,138 @@ def extract_event_fallback(utterance: str) -> Dict[str, Any]:
         elif period == "am" and hour == 12:
             hour = 0
         
-        start_time = event_date.replace(hour=hour, minute=minute, second=0)
+        start_time = event_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
         result["start"] = start_time.isoformat()
-        result["end"] = (start_time + timedelta(hours=1)).isoformat()
-    
-    # Parse duration
-    duration_match = re.search(r"for\s+(\d+)\s+(hour|minute)", utterance_lower)
-    if duration_match and "start" in result:
-        duration = int(duration_match.group(1))
-        unit = duration_match.group(2)
-        
-        start_time = datetime.fromisoformat(result["start"].replace('Z', '+00:00'))
-        if unit == "hour":
-            result["end"] = (start_time + timedelta(hours=duration)).isoformat()
-            result["duration_minutes"] = duration * 60
-        elif unit == "minute":
-            result["end"] = (start_time + timedelta(minutes=duration)).isoformat()
-            result["duration_minutes"] = duration
+        result["end"] = (start_time + end_delta).isoformat()
+        if duration_match:
+            result["duration_minutes"] = duration_minutes
     
     # Parse attendees
-    email_matches = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', utterance)
+    email_matches = _EMAIL_RE.findall(utterance)
     if email_matches:
         result["attendees"] = email_matches
     
     return result
 
-def extract_event(utterance: str) -> Dict[str, Any]:
+# LRU of validated Ollama results keyed on (normalized utterance, date)
+_extract_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+def _cache_get(key: tuple) -> Dict[str, Any]:
+    """Return a copy of a cached extraction, or None on a miss"""
+    event_data = _extract_cache.get(key)
+    if event_data is None:
+        return None
+    _extract_cache.move_to_end(key)
+    return copy.deepcopy(event_data)
+
+def _cache_put(key: tuple, event_data: Dict[str, Any]):
+    """Store a copy so callers mutating the returned dict can't poison the cache"""
+    _extract_cache[key] = copy.deepcopy(event_data)
+    _extract_cache.move_to_end(key)
+    if len(_extract_cache) > EXTRACT_CACHE_SIZE:
+        _extract_cache.popitem(last=False)
+
+async def extract_event(utterance: str) -> Dict[str, Any]:
     """
     Main extraction function with AI and fallback
     """
+    now = datetime.now()
+    # The date is part of the key so relative phrases like "tomorrow" expire at midnight
+    cache_key = (utterance.strip().lower(), now.date().isoformat())
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+    
     try:
-        current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        system_prompt = f"""You are a calendar assistant. Today is {current_date}. 
-        Return JSON with: intent, title, start, end, duration_minutes, attendees.
-        Use CURRENT REAL DATES, not old dates!"""
+        current_date = now.strftime("%Y-%m-%d %H:%M:%S")
         
-        response = requests.post(
-            f"{OLLAMA_HOST}/api/generate",
-            json={
+        event_data = await scheduler.submit(
+            {
                 "model": OLLAMA_MODEL,
                 "prompt": f"Extract calendar event from: {utterance}. Today is {current_date}. Return JSON:",
-                "system": system_prompt,
-                "stream": False,
+                "system": _SYSTEM_PROMPT.format(current_date=current_date),
+                "stream": True,
                 "format": "json",
-                "options": {"temperature": 0.1}
+                # Utterances and the JSON reply are short, so a small context keeps
+                # the KV cache per request down and lets Ollama batch more of them
+                "options": {"temperature": 0.1, "num_ctx": 1024, "num_predict": 256, "num_keep": 0}
             },
             timeout=10
         )
-        
-        result = response.json()
-        event_data = json.loads(result["response"])
+        _validate_event(event_data)
         
         # Validate and correct dates with utterance context
-        return validate_and_correct_dates(event_data, utterance)
+        event_data = validate_and_correct_dates(event_data, utterance)
+        _cache_put(cache_key, event_data)
+        return event_data
         
+    except fastjsonschema.JsonSchemaException as e:
+        logger.error("Ollama returned an invalid event: %s", e)
+        return extract_event_fallback(utterance)
     except Exception as e:
-        logger.error(f"Ollama extraction failed: {e}")
+        logger.error("Ollama extraction failed: %s", e)
         return extract_event_fallback(utterance)
 
 @app.get("/")
 async def root():
     return {"message": "Calendar NLU API is running!"}
 
+# (expires_at, result) of the last Ollama probe
+_health_cache = (0.0, None)
+
+def _model_names(payload: bytes) -> set:
+    """Installed model names from /api/tags, including untagged aliases of ':latest'"""
+    names = set()
+    for model in orjson.loads(payload).get("models", []):
+        name = model.get("name", "")
+        names.add(name)
+        if name.endswith(":latest"):
+            names.add(name[:-len(":latest")])
+    return names
+
 @app.get("/health")
 async def health_check():
     """Check if Ollama is available"""
+    global _health_cache
+    expires_at, cached = _health_cache
+    if cached is not None and time.monotonic() < expires_at:
+        return cached
+    
     try:
-        response = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=5)
-        return {
-            "status": "healthy" if response.status_code == 200 else "degraded",
-            "ollama_available": response.status_code == 200,
-            "model_loaded": OLLAMA_MODEL in response.text if response.status_code == 200 else False
+        response = await http_client.get("/api/tags", timeout=5)
+        available = response.status_code == 200
+        result = {
+            "status": "healthy" if available else "degraded",
+            "ollama_available": available,
+            "model_loaded": OLLAMA_MODEL in _model_names(response.content) if available else False
         }
     except:
-        return {"status": "unhealthy", "ollama_available": False}
+        result = {"status": "unhealthy", "ollama_available": False}
+    
+    _health_cache = (time.monotonic() + HEALTH_CACHE_SECONDS, result)
+    return result
 
-@app.post("/extract", response_model=EventResponse)
+# The extraction is already plain JSON, so skip response_model re-validation
+# and keep EventResponse only as the documented schema.
+@app.post("/extract", response_class=ORJSONResponse, responses={200: {"model": EventResponse}})
 async def extract_event_endpoint(request: EventRequest):
-    result = extract_event(request.utterance)
-    return result
+    result = await extract_event(request.utterance)
+    return ORJSONResponse(result)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    from uvicorn.config import LOGGING_CONFIG
+    
+    # Logging is configured by the entrypoint; route app logs through uvicorn's handler
+    log_config = copy.deepcopy(LOGGING_CONFIG)
+    log_config["root"] = {"handlers": ["default"], "level": "INFO"}
+    
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "4")),
+        log_config=log_config
+    )
\ No newline at end of file
@@ -0,0 +1,23 @@
+# gunicorn.conf.py (logging for the gunicorn entrypoint)
+
+# app.py leaves logging to the entrypoint; give the root logger a handler at
+# INFO so the app's date-correction and fallback logs reach stdout.
+# Gunicorn merges this over its own defaults, so only root and its loggers
+# are overridden (propagate=False keeps gunicorn lines from printing twice).
+logconfig_dict = {
+    "root": {"level": "INFO", "handlers": ["console"]},
+    "loggers": {
+        "gunicorn.error": {
+            "level": "INFO",
+            "handlers": ["error_console"],
+            "propagate": False,
+            "qualname": "gunicorn.error"
+        },
+        "gunicorn.access": {
+            "level": "INFO",
+            "handlers": ["console"],
+            "propagate": False,
+            "qualname": "gunicorn.access"
+        }
+    }
+}
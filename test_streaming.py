@@ -0,0 +1,75 @@
+# test_streaming.py (streamed Ollama JSON parsing in BatchScheduler)
+import asyncio
+import httpx
+import orjson
+import pytest
+
+import app
+
+
+def stream_body(chunks, done_chunk="", delay=0.0, consumed=None):
+    """Ollama-style NDJSON stream; records each fragment actually read in consumed"""
+    fragments = [{"response": c, "done": False} for c in chunks]
+    fragments.append({"response": done_chunk, "done": True})
+
+    async def body():
+        for fragment in fragments:
+            if delay:
+                await asyncio.sleep(delay)
+            if consumed is not None:
+                consumed.append(fragment)
+            yield orjson.dumps(fragment) + b"\n"
+
+    return body()
+
+
+def generate(monkeypatch, body, timeout=10):
+    async def run():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+        async with httpx.AsyncClient(base_url="http://ollama", transport=transport) as client:
+            monkeypatch.setattr(app, "http_client", client)
+            return await app.BatchScheduler._generate({"stream": True}, timeout)
+
+    return asyncio.run(run())
+
+
+def test_braces_inside_string_values(monkeypatch):
+    body = stream_body(['{"intent": "CreateEvent", ', '"title": "a {b} c"', '}'])
+    assert generate(monkeypatch, body) == {"intent": "CreateEvent", "title": "a {b} c"}
+
+
+def test_stops_reading_once_object_closes(monkeypatch):
+    consumed = []
+    body = stream_body(['{"intent": ', '"CreateEvent"', '}', '\n', '  '], consumed=consumed)
+    assert generate(monkeypatch, body) == {"intent": "CreateEvent"}
+    assert len(consumed) == 3
+
+
+def test_unbalanced_brace_in_string_reads_to_done(monkeypatch):
+    body = stream_body(['{"title": "a {b"', '}'])
+    assert generate(monkeypatch, body) == {"title": "a {b"}
+
+
+def test_depth_going_negative_still_parses(monkeypatch):
+    # The first chunk balances early on a brace inside the string and fails to
+    # parse; the real close then drives depth below zero
+    body = stream_body(['{"title": "x}', ' y"}'])
+    assert generate(monkeypatch, body) == {"title": "x} y"}
+
+
+def test_closing_brace_in_done_fragment(monkeypatch):
+    body = stream_body(['{"intent": "CreateEvent"'], done_chunk="}")
+    assert generate(monkeypatch, body) == {"intent": "CreateEvent"}
+
+
+def test_empty_buffer_raises(monkeypatch):
+    with pytest.raises(orjson.JSONDecodeError):
+        generate(monkeypatch, stream_body([]))
+
+
+def test_total_time_is_capped(monkeypatch):
+    # Each chunk arrives well within httpx's per-read timeout, but the
+    # stream as a whole takes longer than the overall deadline
+    body = stream_body(['{"intent": ', '"CreateEvent"', '}'], delay=0.1)
+    with pytest.raises(asyncio.TimeoutError):
+        generate(monkeypatch, body, timeout=0.15)